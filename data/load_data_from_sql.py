@@ -1,12 +1,72 @@
 
+import asyncio
+import hashlib
+import io
+import json
 import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import cycle
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 import pandas as pd
 import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import toml
+from psycopg2 import pool, sql
 
 # Setting up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DB_PARAMS = {
+    'dbname': 'week-1',
+    'user': 'postgres',
+    'password': 'postgres',
+    'host': 'localhost',
+    'port': '5432',
+}
+
+# Database configuration file; environment variables override its values
+CONFIG_PATH = os.environ.get(
+    'TELECOM_DB_CONFIG',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'database.toml'))
+
+# Default location of the local Parquet cache for SQL reads
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# High-water marks of incremental ingestion, one entry per table
+WATERMARK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'watermarks.json')
+
+# Arrow types of PostgreSQL type OIDs, so read_sql_via_copy never guesses from the CSV text;
+# text-like and unlisted types are read as strings, timestamptz is left to pyarrow's parser
+_ARROW_TYPES = {
+    16: pa.bool_(),                 # boolean
+    20: pa.int64(),                 # bigint
+    21: pa.int16(),                 # smallint
+    23: pa.int32(),                 # integer
+    700: pa.float32(),              # real
+    701: pa.float64(),              # double precision
+    1700: pa.float64(),             # numeric
+    1082: pa.date32(),              # date
+    1114: pa.timestamp('us'),       # timestamp
+}
+_INFERRED_OIDS = {1184}             # timestamptz
+
+# Connection pools shared by every loader in the process, keyed by connection parameters
+_connection_pools = {}
+_pool_lock = threading.Lock()
+
+# Loaded database configuration, round-robin iterator over replicas and per-endpoint latencies
+_database_config = None
+_replica_cycle = None
+_endpoint_stats = defaultdict(lambda: {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+_stats_lock = threading.Lock()
+
 def log_decorator(func):
     def wrapper(*args, **kwargs):
         try:
@@ -25,18 +85,369 @@ def connect_to_database(db_params: dict) -> psycopg2.extensions.connection:
     return conn
 
 @log_decorator
-def execute_query(conn: psycopg2.extensions.connection, query: str) -> list:
+def load_database_config(path: str = None) -> dict:
+    """
+    Load the primary/replica endpoints and pool size used by the loader.
+
+    The TOML file has a `[primary]` table of psycopg2 connection parameters (or a `dsn`),
+    optional `[[replicas]]` tables that inherit any primary parameter they do not set, and an
+    optional `[pool]` table with `minconn`/`maxconn`. The environment variables
+    TELECOM_DB_PRIMARY_DSN and TELECOM_DB_REPLICA_DSNS (comma separated) override the file.
+    Without a file, DB_PARAMS is the primary and there are no replicas.
+    """
+    global _database_config, _replica_cycle
+    path = CONFIG_PATH if path is None else path
+    settings = toml.load(path) if os.path.exists(path) else {}
+
+    primary = dict(settings.get('primary', DB_PARAMS))
+    replicas = [entry if 'dsn' in entry else {**primary, **entry} for entry in settings.get('replicas', [])]
+    if os.environ.get('TELECOM_DB_PRIMARY_DSN'):
+        primary = {'dsn': os.environ['TELECOM_DB_PRIMARY_DSN']}
+    if os.environ.get('TELECOM_DB_REPLICA_DSNS'):
+        replicas = [{'dsn': dsn.strip()} for dsn in os.environ['TELECOM_DB_REPLICA_DSNS'].split(',') if dsn.strip()]
+    pool_size = {'minconn': 1, 'maxconn': 5, **settings.get('pool', {})}
+
+    _database_config = {'primary': primary, 'replicas': replicas, 'pool': pool_size}
+    _replica_cycle = cycle(replicas) if replicas else None
+    return _database_config
+
+def get_database_config() -> dict:
+    """Return the loaded database configuration, loading it on first use."""
+    if _database_config is None:
+        load_database_config()
+    return _database_config
+
+def route_db_params(readonly: bool = False) -> dict:
+    """Pick the endpoint for a call: replicas in round-robin for reads, the primary for writes."""
+    config = get_database_config()
+    if not readonly or _replica_cycle is None:
+        return config['primary']
+    with _pool_lock:
+        return next(_replica_cycle)
+
+def _endpoint_name(conn: psycopg2.extensions.connection) -> str:
+    """Identify the server a connection talks to, e.g. `replica-1:5432/week-1`."""
+    info = getattr(conn, 'info', None)
+    if info is None:
+        return 'unknown'
+    return f"{info.host}:{info.port}/{info.dbname}"
+
+def _record_latency(conn: psycopg2.extensions.connection, seconds: float) -> None:
+    """Add one call's duration to the latency stats of the connection's endpoint."""
+    with _stats_lock:
+        stats = _endpoint_stats[_endpoint_name(conn)]
+        stats['calls'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+def get_endpoint_stats() -> pd.DataFrame:
+    """Per-endpoint call counts and latencies of execute_query / read_sql_to_dataframe / read_sql_via_copy."""
+    with _stats_lock:
+        stats = pd.DataFrame.from_dict({name: dict(values) for name, values in _endpoint_stats.items()},
+                                       orient='index', columns=['calls', 'total_seconds', 'max_seconds'])
+    stats['mean_ms'] = stats['total_seconds'] / stats['calls'] * 1000
+    stats['max_ms'] = stats['max_seconds'] * 1000
+    return stats[['calls', 'mean_ms', 'max_ms', 'total_seconds']]
+
+@log_decorator
+def get_connection_pool(db_params: dict = None, minconn: int = None, maxconn: int = None) -> pool.ThreadedConnectionPool:
+    """Return the shared connection pool for the database (the primary by default), creating it on first use."""
+    config = get_database_config()
+    db_params = config['primary'] if db_params is None else db_params
+    minconn = config['pool']['minconn'] if minconn is None else minconn
+    maxconn = config['pool']['maxconn'] if maxconn is None else maxconn
+    key = tuple(sorted(db_params.items()))
+    with _pool_lock:
+        if key not in _connection_pools:
+            _connection_pools[key] = pool.ThreadedConnectionPool(minconn, maxconn, **db_params)
+        return _connection_pools[key]
+
+@contextmanager
+def database_session(db_params: dict = None, minconn: int = None, maxconn: int = None,
+                     readonly: bool = False) -> Iterator[psycopg2.extensions.connection]:
+    """
+    Borrow a warm pooled connection, committing on success and rolling back otherwise.
+    Without explicit `db_params`, read-only sessions go to a replica and others to the primary.
+    """
+    if db_params is None:
+        db_params = route_db_params(readonly)
+    connection_pool = get_connection_pool(db_params, minconn, maxconn)
+    conn = connection_pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # also covers GeneratorExit from abandoned chunk iterators
+        conn.rollback()
+        raise
+    finally:
+        connection_pool.putconn(conn)
+
+@log_decorator
+def close_connection_pools() -> None:
+    """Close every pooled connection, e.g. at the end of a notebook or worker."""
+    with _pool_lock:
+        for connection_pool in _connection_pools.values():
+            connection_pool.closeall()
+        _connection_pools.clear()
+
+def _quote_identifier(name: str) -> sql.SQL:
+    """Quote a column name, escaping `%` (e.g. `ul_tp_<_10_kbps_(%)`) for parameterized execution."""
+    return sql.SQL('"{}"'.format(name.replace('"', '""').replace('%', '%%')))
+
+@log_decorator
+def build_select_query(table_name: str, columns: Optional[Iterable[str]] = None, start=None, end=None,
+                       msisdns: Optional[Iterable] = None, limit: Optional[int] = None,
+                       start_column: str = 'start', end_column: str = 'end',
+                       msisdn_column: str = 'msisdn/number') -> Tuple[sql.Composed, list]:
+    """
+    Build a parameterized SELECT that only returns the requested columns and rows.
+
+    `start`/`end` keep sessions starting at or after `start` and ending at or before `end`,
+    `msisdns` keeps the listed subscribers and `limit` caps the number of rows.
+    Identifiers are quoted and values are passed as parameters, never interpolated, so
+    the returned params list must always be handed to the cursor, even when empty.
+    """
+    if columns is None:
+        projection = sql.SQL('*')
+    else:
+        projection = sql.SQL(', ').join(_quote_identifier(col) for col in columns)
+
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(sql.SQL('{} >= %s').format(sql.Identifier(start_column)))
+        params.append(start)
+    if end is not None:
+        conditions.append(sql.SQL('{} <= %s').format(sql.Identifier(end_column)))
+        params.append(end)
+    if msisdns is not None:
+        conditions.append(sql.SQL('{} = ANY(%s)').format(sql.Identifier(msisdn_column)))
+        params.append(list(msisdns))
+
+    query = sql.SQL('SELECT {} FROM {}').format(projection, sql.Identifier(*table_name.split('.')))
+    if conditions:
+        query += sql.SQL(' WHERE ') + sql.SQL(' AND ').join(conditions)
+    if limit is not None:
+        query += sql.SQL(' LIMIT %s')
+        params.append(int(limit))
+
+    return query, params
+
+@log_decorator
+def execute_query(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable],
+                  params: Optional[list] = None) -> list:
     """Execute a query and return the results."""
+    begin = time.perf_counter()
     cursor = conn.cursor()
-    cursor.execute(query)
+    cursor.execute(query, params)
     results = cursor.fetchall()
     cursor.close()
+    _record_latency(conn, time.perf_counter() - begin)
     return results
 
 @log_decorator
-def read_sql_to_dataframe(conn: psycopg2.extensions.connection, query: str) -> pd.DataFrame:
+def read_sql_to_dataframe(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable],
+                          params: Optional[list] = None) -> pd.DataFrame:
     """Read SQL query results into a Pandas DataFrame."""
-    df = pd.read_sql_query(query, conn)
+    begin = time.perf_counter()
+    if isinstance(query, sql.Composable):
+        query = query.as_string(conn)
+    df = pd.read_sql_query(query, conn, params=params)
+    _record_latency(conn, time.perf_counter() - begin)
+    return df
+
+def read_sql_in_chunks(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable],
+                       chunksize: int = 50000, cursor_name: str = 'xdr_stream_cursor',
+                       params: Optional[list] = None) -> Iterator[pd.DataFrame]:
+    """Stream SQL query results as DataFrame chunks through a server-side cursor."""
+    cursor = conn.cursor(name=cursor_name)
+    cursor.itersize = chunksize
+    try:
+        cursor.execute(query, params)
+        n_rows = 0
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            columns = [desc[0] for desc in cursor.description]
+            n_rows += len(rows)
+            yield pd.DataFrame.from_records(rows, columns=columns)
+        logger.info(f"read_sql_in_chunks streamed {n_rows} rows.")
+    except Exception as e:
+        logger.error(f"Error in read_sql_in_chunks: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+@log_decorator
+def read_sql_via_copy(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable],
+                      params: Optional[list] = None) -> pd.DataFrame:
+    """
+    Fast-path reader: export query results with COPY ... TO STDOUT as CSV and parse them
+    with pyarrow straight into pyarrow-backed columns, skipping per-row Python tuples.
+    Column types come from the server's result description (text stays text, so an ID
+    such as '0208201402342131' keeps its leading zero), not from the CSV values.
+    """
+    begin = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        # COPY takes no parameters, so bind them client-side first
+        bound_query = cursor.mogrify(query, params).decode('utf-8').strip().rstrip(';')
+        cursor.execute(f"SELECT * FROM ({bound_query}) AS result LIMIT 0")
+        column_types = {column.name: _ARROW_TYPES.get(column.type_code, pa.string())
+                        for column in cursor.description if column.type_code not in _INFERRED_OIDS}
+        copy_query = f"COPY ({bound_query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+        buffer = io.BytesIO()
+        cursor.copy_expert(copy_query, buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+    # COPY writes NULL unquoted and empty strings quoted, so only the unquoted form is null
+    convert_options = pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True,
+                                            quoted_strings_can_be_null=False)
+    table = pa_csv.read_csv(buffer, convert_options=convert_options)
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    _record_latency(conn, time.perf_counter() - begin)
+    return df
+
+@log_decorator
+def compare_sql_readers(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable],
+                        params: Optional[list] = None, repeat: int = 3) -> pd.DataFrame:
+    """Benchmark read_sql_to_dataframe against read_sql_via_copy on the same query."""
+    readers = {
+        'read_sql_to_dataframe': read_sql_to_dataframe,
+        'read_sql_via_copy': read_sql_via_copy,
+    }
+    results = []
+    for name, reader in readers.items():
+        timings = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            df = reader(conn, query, params)
+            timings.append(time.perf_counter() - begin)
+        results.append({
+            'reader': name,
+            'rows': len(df),
+            'best_seconds': min(timings),
+            'mean_seconds': sum(timings) / len(timings),
+            'memory_mb': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        })
+    benchmark = pd.DataFrame(results).set_index('reader')
+    benchmark['speedup'] = benchmark.loc['read_sql_to_dataframe', 'best_seconds'] / benchmark['best_seconds']
+    return benchmark
+
+def _postgres_type(dtype) -> str:
+    """Map a pandas dtype to the PostgreSQL column type used by the COPY writer."""
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_unsigned_integer_dtype(dtype):
+        # uint64 identifiers (e.g. bearer_id) overflow BIGINT
+        return 'NUMERIC(20)'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'BIGINT'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'DOUBLE PRECISION'
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return 'TIMESTAMPTZ'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+@log_decorator
+def write_dataframe_via_copy(conn: psycopg2.extensions.connection, df: pd.DataFrame, table_name: str,
+                             mode: str = 'swap', chunksize: int = 100000) -> dict:
+    """
+    Bulk-write a DataFrame with COPY ... FROM STDIN, `chunksize` rows at a time.
+
+    mode='swap' loads into a fresh `<table>_staging` table and, in the same transaction,
+    drops the old table and renames the staging table, so readers never see a partial table.
+    mode='append' copies straight into the existing table.
+    Returns the number of rows written, elapsed seconds and rows per second.
+    """
+    if mode not in ('swap', 'append'):
+        logger.error("Mode unknown")
+        raise ValueError("Mode unknown")
+
+    *schema, name = table_name.split('.')
+    target = sql.Identifier(*schema, name)
+    staging = sql.Identifier(*schema, f"{name}_staging")
+    load_table = staging if mode == 'swap' else target
+    columns = sql.SQL(', ').join(sql.Identifier(col) for col in df.columns)
+
+    begin = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if mode == 'swap':
+            column_definitions = sql.SQL(', ').join(
+                sql.SQL('{} {}').format(sql.Identifier(col), sql.SQL(_postgres_type(dtype)))
+                for col, dtype in df.dtypes.items())
+            cursor.execute(sql.SQL('DROP TABLE IF EXISTS {}').format(staging))
+            cursor.execute(sql.SQL('CREATE TABLE {} ({})').format(staging, column_definitions))
+
+        copy_query = sql.SQL('COPY {} ({}) FROM STDIN WITH (FORMAT csv)').format(load_table, columns)
+        copy_query = copy_query.as_string(conn)
+        for offset in range(0, len(df), chunksize):
+            buffer = io.StringIO()
+            df.iloc[offset:offset + chunksize].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_query, buffer)
+
+        if mode == 'swap':
+            cursor.execute(sql.SQL('DROP TABLE IF EXISTS {}').format(target))
+            cursor.execute(sql.SQL('ALTER TABLE {} RENAME TO {}').format(staging, sql.Identifier(name)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - begin
+    rows_per_second = len(df) / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"Wrote {len(df)} rows to {table_name} in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s).")
+    return {'rows': len(df), 'seconds': elapsed, 'rows_per_second': rows_per_second}
+
+def _table_watermark(conn: psycopg2.extensions.connection, table_name: str,
+                     watermark_column: Optional[str] = 'end') -> str:
+    """Describe the current state of a table by its row count and latest `watermark_column` value."""
+    latest = sql.SQL('max({})').format(sql.Identifier(watermark_column)) if watermark_column else sql.SQL('NULL')
+    query = sql.SQL('SELECT count(*), {} FROM {}').format(latest, sql.Identifier(*table_name.split('.')))
+    count, max_value = execute_query(conn, query)[0]
+    return f"{count}|{max_value}"
+
+@log_decorator
+def read_sql_cached(conn: psycopg2.extensions.connection, query: Union[str, sql.Composable], table_name: str,
+                    params: Optional[list] = None, cache_dir: str = CACHE_DIR,
+                    watermark_column: Optional[str] = 'end') -> pd.DataFrame:
+    """
+    Read-through cache for read_sql_to_dataframe.
+
+    Results are stored as zstd-compressed Parquet keyed by a hash of the query and its
+    parameters, together with the source table's row count / max(`watermark_column`)
+    watermark. A cached file is served (a plain Parquet read, decompressed into a new DataFrame)
+    only while the watermark is unchanged; pass watermark_column=None for tables without a
+    session end column.
+    """
+    query_text = query.as_string(conn) if isinstance(query, sql.Composable) else query
+    key = hashlib.sha256(f"{query_text}|{params!r}".encode('utf-8')).hexdigest()[:32]
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    watermark = _table_watermark(conn, table_name, watermark_column).encode('utf-8')
+
+    if os.path.exists(path):
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(b'watermark') == watermark:
+            logger.info(f"Serving {table_name} from cache {path}.")
+            return pq.read_table(path).to_pandas()
+
+    df = read_sql_to_dataframe(conn, query, params)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'watermark': watermark})
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write then rename so concurrent readers never see a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
     return df
 
 @log_decorator
@@ -45,26 +456,188 @@ def close_connection(conn: psycopg2.extensions.connection) -> None:
     conn.close()
 
 @log_decorator
-def get_dataframe(table_name: str) -> pd.DataFrame:
-    """Main function to get the DataFrame."""
-    db_params = {
-        'dbname': 'week-1',
-        'user': 'postgres',
-        'password': 'postgres',
-        'host': 'localhost',
-        'port': '5432',
-    }
+def get_dataframe(table_name: str, columns: Optional[Iterable[str]] = None, start=None, end=None,
+                  msisdns: Optional[Iterable] = None, limit: Optional[int] = None,
+                  cache_dir: Optional[str] = None, watermark_column: Optional[str] = 'end') -> pd.DataFrame:
+    """
+    Main function to get the DataFrame, optionally restricted to a column and row slice.
+    With `cache_dir` set, reads go through the Parquet cache of read_sql_cached, invalidated by
+    `watermark_column`; pass watermark_column=None for tables without an end column
+    (e.g. engagement_metric, experience_metric).
+    """
+    # Only the requested slice leaves the database
+    query, params = build_select_query(table_name, columns=columns, start=start, end=end,
+                                       msisdns=msisdns, limit=limit)
+
+    # Borrow a pooled replica connection and read results into a Pandas DataFrame
+    with database_session(readonly=True) as conn:
+        if cache_dir is None:
+            df = read_sql_to_dataframe(conn, query, params)
+        else:
+            df = read_sql_cached(conn, query, table_name, params, cache_dir=cache_dir,
+                                 watermark_column=watermark_column)
+
+    return df
+
+def get_dataframe_chunks(table_name: str, chunksize: int = 50000, **filters) -> Iterator[pd.DataFrame]:
+    """
+    Stream a table as DataFrame chunks of `chunksize` rows to keep memory bounded.
+    `filters` accepts the same projection and row filters as build_select_query.
+    """
+    query, params = build_select_query(table_name, **filters)
+
+    # Named cursors only live inside a transaction, which ends with the session
+    with database_session(readonly=True) as conn:
+        yield from read_sql_in_chunks(conn, query, chunksize=chunksize, params=params)
 
-    # Example query
-    query = f"SELECT * FROM {table_name};"
+def _read_in_session(query: Union[str, sql.Composable], params: Optional[list], db_params: Optional[dict]) -> pd.DataFrame:
+    """Run one read on its own pooled connection (executed in a worker thread)."""
+    with database_session(db_params, readonly=True) as conn:
+        return read_sql_to_dataframe(conn, query, params)
 
-    # Connect to the database
-    conn = connect_to_database(db_params)
+async def read_queries_async(queries: Dict[str, Union[str, sql.Composable, tuple]],
+                             db_params: dict = None) -> Dict[str, pd.DataFrame]:
+    """
+    Run several independent reads concurrently and return {name: DataFrame}.
 
-    # Read results into a Pandas DataFrame
-    df = read_sql_to_dataframe(conn, query)
+    `queries` maps a name to a query or a (query, params) tuple. Each read runs in a worker
+    thread on its own pooled connection (psycopg2 releases the GIL while waiting on the
+    server), and concurrency is capped at the pool size so no pool is ever exhausted.
+    """
+    semaphore = asyncio.Semaphore(get_database_config()['pool']['maxconn'])
+    loop = asyncio.get_running_loop()
 
-    # Close the database connection
-    close_connection(conn)
+    async def fetch(name, query):
+        query, params = query if isinstance(query, tuple) else (query, None)
+        async with semaphore:
+            df = await loop.run_in_executor(None, _read_in_session, query, params, db_params)
+        return name, df
 
+    results = await asyncio.gather(*(fetch(name, query) for name, query in queries.items()))
+    logger.info(f"read_queries_async loaded {len(results)} queries.")
+    return dict(results)
+
+async def get_dataframes_async(table_names: Iterable[str], **filters) -> Dict[str, pd.DataFrame]:
+    """Load several tables concurrently; `filters` are applied to every table as in get_dataframe."""
+    queries = {name: build_select_query(name, **filters) for name in table_names}
+    return await read_queries_async(queries)
+
+def get_dataframes(table_names: Iterable[str], **filters) -> Dict[str, pd.DataFrame]:
+    """
+    Blocking wrapper around get_dataframes_async for scripts.
+    Inside a notebook, where an event loop is already running, `await get_dataframes_async(...)` instead.
+    """
+    return asyncio.run(get_dataframes_async(table_names, **filters))
+
+def load_watermark(table_name: str, path: str = WATERMARK_PATH) -> Optional[dict]:
+    """Return the last ingested (end, key) high-water mark of a table, or None before the first run."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get(table_name)
+
+@log_decorator
+def save_watermark(table_name: str, watermark: dict, path: str = WATERMARK_PATH) -> None:
+    """Persist the high-water mark of a table once its delta has been processed."""
+    watermarks = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            watermarks = json.load(f)
+    watermarks[table_name] = watermark
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(tmp_path, path)
+
+def watermark_of(df: pd.DataFrame, end_column: str = 'end', key_column: str = 'bearer_id') -> dict:
+    """High-water mark of a delta ordered by (end_column, key_column): its last row."""
+    last = df.iloc[-1]
+    if pd.isna(last[end_column]) or pd.isna(last[key_column]):
+        # a 'NaT'/'None' literal would break every later incremental query
+        logger.error(f"Refusing a watermark with a null {end_column} or {key_column}.")
+        raise ValueError(f"Watermark row has a null {end_column} or {key_column}")
+    # Stored as text; Postgres casts the literals back to the column types
+    return {'end': str(last[end_column]), 'key': str(last[key_column])}
+
+@log_decorator
+def build_incremental_query(table_name: str, watermark: Optional[dict] = None,
+                            columns: Optional[Iterable[str]] = None, end_column: str = 'end',
+                            key_column: str = 'bearer_id') -> Tuple[sql.Composed, list]:
+    """
+    Build a SELECT of the sessions after `watermark`, ordered by (end_column, key_column).
+    The key column breaks ties between sessions that ended at the same time. Rows with a NULL
+    end or key cannot be ordered against the mark and are left out (see get_unkeyed_sessions).
+    """
+    if columns is None:
+        projection = sql.SQL('*')
+    else:
+        columns = list(columns) + [col for col in (end_column, key_column) if col not in columns]
+        projection = sql.SQL(', ').join(_quote_identifier(col) for col in columns)
+    order = sql.SQL('{}, {}').format(sql.Identifier(end_column), sql.Identifier(key_column))
+
+    query = sql.SQL('SELECT {} FROM {}').format(projection, sql.Identifier(*table_name.split('.')))
+    query += sql.SQL(' WHERE {} IS NOT NULL AND {} IS NOT NULL').format(
+        sql.Identifier(end_column), sql.Identifier(key_column))
+    params = []
+    if watermark is not None:
+        query += sql.SQL(' AND ({}) > (%s, %s)').format(order)
+        params = [watermark['end'], watermark['key']]
+    query += sql.SQL(' ORDER BY {}').format(order)
+    return query, params
+
+def get_unkeyed_sessions(table_name: str, columns: Optional[Iterable[str]] = None, end_column: str = 'end',
+                         key_column: str = 'bearer_id') -> pd.DataFrame:
+    """
+    Return the sessions with a NULL end or key, which incremental ingestion never picks up.
+    They carry no position to resume from, so this reads all of them on every call.
+    """
+    projection = sql.SQL('*') if columns is None else sql.SQL(', ').join(_quote_identifier(col) for col in columns)
+    query = sql.SQL('SELECT {} FROM {} WHERE {} IS NULL OR {} IS NULL').format(
+        projection, sql.Identifier(*table_name.split('.')), sql.Identifier(end_column), sql.Identifier(key_column))
+
+    with database_session(readonly=True) as conn:
+        # an empty parameter list makes psycopg2 unescape the %% written by _quote_identifier
+        df = read_sql_to_dataframe(conn, query, [])
+
+    logger.info(f"get_unkeyed_sessions found {len(df)} sessions without {end_column} or {key_column} in {table_name}.")
+    return df
+
+def get_new_sessions(table_name: str, columns: Optional[Iterable[str]] = None, end_column: str = 'end',
+                     key_column: str = 'bearer_id', watermark_path: str = WATERMARK_PATH,
+                     commit: bool = True) -> pd.DataFrame:
+    """
+    Incremental ingestion: return only the sessions that ended after the stored high-water mark.
+
+    With commit=True the new mark is saved immediately; pass commit=False to save it with
+    save_watermark(table_name, watermark_of(delta)) after the cleaning and aggregation
+    stages succeed. Sessions arriving late with an end time before the mark are not picked up.
+    """
+    watermark = load_watermark(table_name, watermark_path)
+    query, params = build_incremental_query(table_name, watermark, columns, end_column, key_column)
+
+    with database_session(readonly=True) as conn:
+        df = read_sql_to_dataframe(conn, query, params)
+
+    logger.info(f"get_new_sessions found {len(df)} new sessions in {table_name} after {watermark}.")
+    if commit and not df.empty:
+        save_watermark(table_name, watermark_of(df, end_column, key_column), watermark_path)
     return df
+
+def get_new_session_chunks(table_name: str, chunksize: int = 50000, columns: Optional[Iterable[str]] = None,
+                           end_column: str = 'end', key_column: str = 'bearer_id',
+                           watermark_path: str = WATERMARK_PATH) -> Iterator[pd.DataFrame]:
+    """
+    Stream the sessions after the stored high-water mark in chunks.
+    The mark advances only after the last chunk has been consumed.
+    """
+    watermark = load_watermark(table_name, watermark_path)
+    query, params = build_incremental_query(table_name, watermark, columns, end_column, key_column)
+
+    last_chunk = None
+    with database_session(readonly=True) as conn:
+        for chunk in read_sql_in_chunks(conn, query, chunksize=chunksize, params=params):
+            last_chunk = chunk
+            yield chunk
+
+    if last_chunk is not None:
+        save_watermark(table_name, watermark_of(last_chunk, end_column, key_column), watermark_path)
@@ -0,0 +1,436 @@
+import json
+import logging
+import os
+import time
+import pandas as pd
+import numpy as np
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MSISDN_COLUMN = 'msisdn/number'
+
+APPLICATIONS = ['social_media', 'google', 'email', 'youtube', 'netflix', 'gaming', 'other']
+
+# feature name -> raw xDR column counted (non-null values) per subscriber
+COUNT_FEATURES = {
+    'session_freq': 'bearer_id',
+}
+
+# feature name -> raw xDR columns added row-wise, then summed per subscriber
+SUM_FEATURES = {
+    'session_duration(ms)': ['dur._(ms)'],
+    'total_ul_(bytes)': ['total_ul_(bytes)'],
+    'total_dl_(bytes)': ['total_dl_(bytes)'],
+    'session_traffic(bytes)': ['total_ul_(bytes)', 'total_dl_(bytes)'],
+    **{app: [f'{app}_dl_(bytes)', f'{app}_ul_(bytes)'] for app in APPLICATIONS},
+}
+
+# feature name -> raw xDR columns added row-wise, then averaged per subscriber
+MEAN_FEATURES = {
+    'avg_rtt(ms)': ['avg_rtt_dl_(ms)', 'avg_rtt_ul_(ms)'],
+    'avg_tp(kbps)': ['avg_bearer_tp_dl_(kbps)', 'avg_bearer_tp_ul_(kbps)'],
+    'avg_tcp(bytes)': ['tcp_dl_retrans._vol_(bytes)', 'tcp_ul_retrans._vol_(bytes)'],
+}
+
+# feature name -> raw xDR column whose most frequent value is kept per subscriber
+MODE_FEATURES = {
+    'freq_handset_type': 'handset_type',
+}
+
+
+def encode_keys(keys: pd.Series) -> tuple:
+    """
+    hash-encode subscriber keys into dense integer codes (order of first appearance, no sort).
+    Missing keys get code -1 and are left out of every aggregate, like groupby(dropna=True)
+    """
+    codes, uniques = pd.factorize(keys, sort=False)
+    return codes, pd.Index(uniques, name=keys.name)
+
+
+def _row_values(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """
+    row-wise total of `columns` as float64; a missing value in any of them makes the row missing
+    """
+    values = df[columns[0]].to_numpy(dtype=np.float64, na_value=np.nan)
+    for column in columns[1:]:
+        values = values + df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return values
+
+
+def group_count(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    non-missing values per group code
+    """
+    mask = (codes >= 0) & ~np.isnan(values)
+    return np.bincount(codes[mask], minlength=n_groups)
+
+
+def group_sum(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    sum of non-missing values per group code (0 for groups with none, like groupby().sum())
+    """
+    mask = (codes >= 0) & ~np.isnan(values)
+    return np.bincount(codes[mask], weights=values[mask], minlength=n_groups)
+
+
+def group_mean(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    mean of non-missing values per group code (NaN for groups with none)
+    """
+    counts = group_count(codes, values, n_groups)
+    sums = group_sum(codes, values, n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def group_min(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    minimum of non-missing values per group code (NaN for groups with none)
+    """
+    mask = (codes >= 0) & ~np.isnan(values)
+    minima = np.full(n_groups, np.inf)
+    np.minimum.at(minima, codes[mask], values[mask])
+    minima[np.isinf(minima) & (group_count(codes, values, n_groups) == 0)] = np.nan
+    return minima
+
+
+def group_max(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    maximum of non-missing values per group code (NaN for groups with none)
+    """
+    mask = (codes >= 0) & ~np.isnan(values)
+    maxima = np.full(n_groups, -np.inf)
+    np.maximum.at(maxima, codes[mask], values[mask])
+    maxima[np.isinf(maxima) & (group_count(codes, values, n_groups) == 0)] = np.nan
+    return maxima
+
+
+def group_mode(codes: np.ndarray, values, n_groups: int) -> np.ndarray:
+    """
+    most frequent non-missing value per group code, fully vectorized (no per-group Python calls).
+    Ties go to the smallest value, so the result is deterministic and always a scalar;
+    groups with no values get NaN
+    """
+    value_codes, uniques = pd.factorize(np.asarray(values), sort=True)
+    modes = np.full(n_groups, np.nan, dtype=object)
+    if len(uniques) == 0:
+        return modes
+    mask = (codes >= 0) & (value_codes >= 0)
+    pairs = codes[mask].astype(np.int64) * len(uniques) + value_codes[mask]
+    pairs, counts = np.unique(pairs, return_counts=True)
+    group_codes, value_codes = np.divmod(pairs, len(uniques))
+
+    # highest count first, then smallest value, within each group
+    order = np.lexsort((value_codes, -counts, group_codes))
+    group_codes, value_codes = group_codes[order], value_codes[order]
+    first = np.r_[True, group_codes[1:] != group_codes[:-1]]
+
+    modes[group_codes[first]] = np.asarray(uniques, dtype=object)[value_codes[first]]
+    return modes
+
+
+def user_features(df: pd.DataFrame, key_column: str = MSISDN_COLUMN) -> pd.DataFrame:
+    """
+    per-subscriber engagement, experience and per-application traffic table in one pass:
+    the keys are factorized once and every feature is a bincount over the same codes.
+    Features whose source columns are missing from `df` are skipped
+    """
+    codes, index = encode_keys(df[key_column])
+    n_groups = len(index)
+    features = {}
+
+    for feature, column in COUNT_FEATURES.items():
+        if column in df.columns:
+            features[feature] = group_count(codes, _row_values(df, [column]), n_groups)
+    for reducer, spec in ((group_sum, SUM_FEATURES), (group_mean, MEAN_FEATURES)):
+        for feature, columns in spec.items():
+            if set(columns).issubset(df.columns):
+                features[feature] = reducer(codes, _row_values(df, columns), n_groups)
+    for feature, column in MODE_FEATURES.items():
+        if column in df.columns:
+            features[feature] = group_mode(codes, df[column], n_groups)
+
+    return pd.DataFrame(features, index=index)
+
+
+def _notebook_user_features(df: pd.DataFrame, key_column: str = MSISDN_COLUMN) -> pd.DataFrame:
+    """
+    the same table built the way the notebooks do it: one groupby().agg per metric, then a join
+    """
+    derived = pd.DataFrame({key_column: df[key_column]})
+    for feature, columns in {**SUM_FEATURES, **MEAN_FEATURES}.items():
+        derived[feature] = df[columns].sum(axis=1, min_count=len(columns)) if len(columns) > 1 else df[columns[0]]
+    derived['session_freq'] = df['bearer_id']
+    derived['freq_handset_type'] = df['handset_type']
+
+    tables = [derived.groupby(key_column).agg({'session_freq': 'count'})]
+    tables += [derived.groupby(key_column).agg({feature: 'sum'}) for feature in SUM_FEATURES]
+    tables += [derived.groupby(key_column).agg({feature: 'mean'}) for feature in MEAN_FEATURES]
+    tables += [derived.groupby(key_column).agg({'freq_handset_type': pd.Series.mode})]
+    return pd.concat(tables, axis=1)
+
+
+def benchmark_user_features(df: pd.DataFrame, key_column: str = MSISDN_COLUMN, repeat: int = 3) -> pd.DataFrame:
+    """
+    benchmark user_features against the notebooks' per-metric groupby approach on the same xDRs
+    """
+    builders = {
+        'notebook_groupby': _notebook_user_features,
+        'user_features': user_features,
+    }
+    results = []
+    for name, builder in builders.items():
+        timings = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            table = builder(df, key_column)
+            timings.append(time.perf_counter() - begin)
+        results.append({
+            'method': name,
+            'users': len(table),
+            'best_seconds': min(timings),
+            'mean_seconds': sum(timings) / len(timings),
+        })
+    benchmark = pd.DataFrame(results).set_index('method')
+    benchmark['speedup'] = benchmark.loc['notebook_groupby', 'best_seconds'] / benchmark['best_seconds']
+    return benchmark
+
+
+class AggregateStore:
+    """
+    Persistent per-subscriber partial aggregates, so new xDR batches are folded in
+    incrementally instead of rescanning history.
+
+    Every SUM/MEAN feature is kept as count, sum, sum of squares, min and max (COUNT features
+    as a count only), all of which merge exactly across batches. Rows live in `n_partitions`
+    Parquet files chosen by a hash of the key, so an update rewrites only the partitions its
+    subscribers hash to.
+
+    Keys are cast to one canonical `key_dtype` (recorded in the store's manifest) before
+    hashing, so the same MSISDN read as float64 or int64 always lands in the same partition.
+    """
+
+    _MERGE = {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+    def __init__(self, path: str, n_partitions: int = 16, key_column: str = MSISDN_COLUMN,
+                 key_dtype: str = 'int64'):
+        self.path = path
+        manifest_path = os.path.join(path, '_store.json')
+        if os.path.exists(manifest_path):
+            # the layout of an existing store wins over the arguments
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            n_partitions, key_column = manifest['n_partitions'], manifest['key_column']
+            key_dtype = manifest.get('key_dtype', key_dtype)
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(manifest_path, 'w') as f:
+                json.dump({'n_partitions': n_partitions, 'key_column': key_column, 'key_dtype': key_dtype},
+                          f, indent=2)
+        self.n_partitions = n_partitions
+        self.key_column = key_column
+        self.key_dtype = key_dtype
+
+    def _canonical_keys(self, keys: pd.Series) -> pd.Series:
+        """
+        cast non-missing keys to the store's key dtype; raises ValueError for keys that
+        would change value (e.g. a fractional float into an int64 store)
+        """
+        try:
+            canonical = keys.astype(self.key_dtype)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Keys of dtype {keys.dtype} cannot be stored as {self.key_dtype}: {e}") from e
+        if pd.api.types.is_numeric_dtype(keys.dtype) and pd.api.types.is_numeric_dtype(canonical.dtype) \
+                and not (canonical.to_numpy(dtype=np.float64) == keys.to_numpy(dtype=np.float64)).all():
+            raise ValueError(f"Keys of dtype {keys.dtype} are not exactly representable as {self.key_dtype}.")
+        return canonical
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self.path, f"part-{partition:04d}.parquet")
+
+    def _partials(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """
+        partial aggregates of one batch, one row per subscriber
+        """
+        codes, index = encode_keys(batch[self.key_column])
+        n_groups = len(index)
+        reducers = {'count': group_count, 'sum': group_sum, 'min': group_min, 'max': group_max}
+        partials = {}
+
+        for feature, column in COUNT_FEATURES.items():
+            if column in batch.columns:
+                partials[f"{feature}__count"] = group_count(codes, _row_values(batch, [column]), n_groups)
+        for feature, columns in {**SUM_FEATURES, **MEAN_FEATURES}.items():
+            if set(columns).issubset(batch.columns):
+                values = _row_values(batch, columns)
+                for statistic, reducer in reducers.items():
+                    partials[f"{feature}__{statistic}"] = reducer(codes, values, n_groups)
+                partials[f"{feature}__sumsq"] = group_sum(codes, values * values, n_groups)
+
+        return pd.DataFrame(partials, index=index).reset_index()
+
+    def _merge(self, partials: pd.DataFrame) -> pd.DataFrame:
+        """
+        combine partial aggregates of the same subscriber
+        """
+        merge = {column: self._MERGE[column.rsplit('__', 1)[1]] for column in partials.columns
+                 if column != self.key_column}
+        return partials.groupby(self.key_column, sort=False).agg(merge).reset_index()
+
+    def update(self, batch: pd.DataFrame) -> int:
+        """
+        fold a batch of xDRs into the store; returns the number of partitions rewritten
+        """
+        batch = batch[batch[self.key_column].notna()]
+        if batch.empty:
+            return 0
+        batch = batch.assign(**{self.key_column: self._canonical_keys(batch[self.key_column])})
+        partials = self._partials(batch)
+        partitions = pd.util.hash_pandas_object(partials[self.key_column], index=False).to_numpy() % self.n_partitions
+
+        for partition, new in partials.groupby(partitions, sort=False):
+            path = self._partition_path(partition)
+            if os.path.exists(path):
+                new = pd.concat([pd.read_parquet(path), new], ignore_index=True)
+            # Write then rename so readers never see a half-written partition
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            self._merge(new).to_parquet(tmp_path, index=False, compression='zstd')
+            os.replace(tmp_path, path)
+        logger.info(f"Folded {len(batch)} xDRs for {len(partials)} subscribers into {self.path}.")
+        return len(np.unique(partitions))
+
+    def partials(self) -> pd.DataFrame:
+        """
+        all stored partial aggregates, indexed by subscriber
+        """
+        paths = [self._partition_path(partition) for partition in range(self.n_partitions)]
+        frames = [pd.read_parquet(path) for path in paths if os.path.exists(path)]
+        if not frames:
+            return pd.DataFrame(index=pd.Index([], name=self.key_column))
+        return pd.concat(frames, ignore_index=True).set_index(self.key_column)
+
+    def features(self) -> pd.DataFrame:
+        """
+        per-subscriber feature table derived from the stored aggregates, with the same
+        numeric columns as user_features on the full history (modes are not mergeable)
+        """
+        partials = self.partials()
+        features = {}
+        for feature in COUNT_FEATURES:
+            if f"{feature}__count" in partials.columns:
+                features[feature] = partials[f"{feature}__count"]
+        for feature in SUM_FEATURES:
+            if f"{feature}__sum" in partials.columns:
+                features[feature] = partials[f"{feature}__sum"]
+        for feature in MEAN_FEATURES:
+            if f"{feature}__sum" in partials.columns:
+                features[feature] = partials[f"{feature}__sum"] / partials[f"{feature}__count"].where(lambda c: c > 0)
+        return pd.DataFrame(features, index=partials.index)
+
+    def engagement(self) -> pd.DataFrame:
+        """
+        engagement metrics per subscriber: session frequency, duration and traffic
+        """
+        return self.features()[['session_freq', 'session_duration(ms)', 'session_traffic(bytes)']]
+
+    def experience(self) -> pd.DataFrame:
+        """
+        experience metrics per subscriber: average RTT, throughput and TCP retransmission
+        """
+        return self.features()[list(MEAN_FEATURES)]
+
+    def summary(self, feature: str) -> pd.DataFrame:
+        """
+        count, mean, std (ddof=1), min and max of `feature`'s per-xDR values for every subscriber
+        """
+        partials = self.partials()
+        count = partials[f"{feature}__count"]
+        mean = partials[f"{feature}__sum"] / count.where(count > 0)
+        variance = (partials[f"{feature}__sumsq"] - count * mean ** 2) / (count - 1).where(count > 1)
+        return pd.DataFrame({
+            'count': count,
+            'mean': mean,
+            'std': np.sqrt(variance.clip(lower=0)),
+            'min': partials[f"{feature}__min"],
+            'max': partials[f"{feature}__max"],
+        })
+
+
+def top_k(df: pd.DataFrame, column: str, k: int = 10, largest: bool = True, keep: str = 'first') -> pd.DataFrame:
+    """
+    the `k` rows with the largest (or smallest) `column`, by partial selection instead of a full sort.
+    Bottom-k rows come back in ascending order; `keep` is passed to nlargest/nsmallest
+    """
+    if largest:
+        return df.nlargest(k, column, keep=keep)
+    return df.nsmallest(k, column, keep=keep)
+
+
+def leaderboards(df: pd.DataFrame, columns: list, k: int = 10, largest: bool = True) -> dict:
+    """
+    top-k (or bottom-k) rows for every column in `columns`, from one np.partition over all of them.
+    Same rows and order as top_k(..., keep='first') per column: NaN never ranks and ties at
+    the k-th place go to the earliest rows
+    """
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    keys = -values if largest else values.copy()
+    keys[np.isnan(keys)] = np.inf
+    k = min(k, len(df))
+    if k == 0:
+        return {column: df.iloc[:0] for column in columns}
+    thresholds = np.partition(keys, k - 1, axis=0)[k - 1]
+
+    boards = {}
+    for position, column in enumerate(columns):
+        key, threshold = keys[:, position], thresholds[position]
+        selected = np.flatnonzero(key < threshold)
+        if np.isfinite(threshold):
+            ties = np.flatnonzero(key == threshold)[:k - len(selected)]
+            selected = np.concatenate([selected, ties])
+        # sort the k survivors only, by value then position
+        selected = selected[np.lexsort((selected, key[selected]))]
+        boards[column] = df.iloc[selected]
+    return boards
+
+
+class StreamingLeaderboard:
+    """
+    Top-k (or bottom-k) rows per metric maintained over a stream of chunks.
+
+    Each update keeps only the best `k` rows of the current board plus the chunk, a bounded
+    heap merge done with nlargest/nsmallest, so memory stays at k rows per metric. Rows are
+    ranked as they come: feed per-subscriber aggregates (e.g. AggregateStore partitions, whose
+    subscribers never repeat across partitions), not raw xDRs.
+    """
+
+    def __init__(self, columns: list, k: int = 10, largest: bool = True):
+        self.columns = columns
+        self.k = k
+        self.largest = largest
+        self.boards = {}
+
+    def update(self, chunk: pd.DataFrame) -> 'StreamingLeaderboard':
+        """
+        fold one chunk into every metric's board
+        """
+        for column, candidates in leaderboards(chunk, self.columns, self.k, self.largest).items():
+            if column in self.boards:
+                candidates = pd.concat([self.boards[column], candidates])
+            self.boards[column] = top_k(candidates, column, self.k, self.largest)
+        return self
+
+    def update_chunks(self, chunks) -> 'StreamingLeaderboard':
+        """
+        fold every chunk of an iterable into the boards
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def leaderboard(self, column: str) -> pd.DataFrame:
+        """
+        current top-k (or bottom-k) rows for `column`
+        """
+        return self.boards[column]
@@ -1,12 +1,102 @@
+import json
 import logging
+import os
+from typing import Callable, Iterable, Iterator
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import Normalizer, MinMaxScaler, StandardScaler
+from scripts.sketches import TDigest
 
 # Setting up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _iqr_bounds(quartiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tukey's fences from a quantile([0.25, 0.75]) frame: rows 'lower' and 'upper', one column per feature
+    """
+    iqr = quartiles.loc[0.75] - quartiles.loc[0.25]
+    return pd.DataFrame({'lower': quartiles.loc[0.25] - 1.5 * iqr, 'upper': quartiles.loc[0.75] + 1.5 * iqr}).T
+
+
+class RowHashSet:
+    """
+    Set of 64-bit row hashes (8 bytes per row), used by drop_duplicate to find duplicates
+    across chunks and across runs.
+
+    Hashes live in a few sorted runs whose sizes at least halve from one run to the next; a new
+    batch becomes a run and is merged with its neighbours only while they are comparable in
+    size, so every hash is rewritten O(log n) times over a stream. Runs are never modified in
+    place, which makes copy() a cheap snapshot sharing them.
+    """
+
+    def __init__(self, hashes: np.ndarray = None):
+        self.runs = []
+        if hashes is not None and len(hashes):
+            self._push(np.unique(hashes.astype(np.uint64)))
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        if len(self.runs) > 1:
+            self.runs = [self._merge_runs(self.runs)]
+        return self.runs[0] if self.runs else np.empty(0, dtype=np.uint64)
+
+    @staticmethod
+    def _merge_runs(runs: list) -> np.ndarray:
+        # the stable sort is a timsort, which merges already sorted runs in linear time
+        merged = np.sort(np.concatenate(runs), kind='stable')
+        merged.setflags(write=False)
+        return merged
+
+    def _push(self, run: np.ndarray) -> None:
+        run.setflags(write=False)
+        self.runs.append(run)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            self.runs[-2:] = [self._merge_runs(self.runs[-2:])]
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        # sorted queries make searchsorted walk each run in order instead of jumping at random
+        order = np.argsort(hashes, kind='stable')
+        queries = hashes[order].astype(np.uint64)
+        found_sorted = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, queries)
+            positions[positions == len(run)] = 0
+            found_sorted |= run[positions] == queries
+        found = np.empty(len(hashes), dtype=bool)
+        found[order] = found_sorted
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        # callers pass hashes that are unique and not yet in the set
+        if len(hashes):
+            self._push(np.sort(hashes.astype(np.uint64)))
+
+    def copy(self) -> 'RowHashSet':
+        hash_set = RowHashSet()
+        hash_set.runs = list(self.runs)
+        return hash_set
+
+    @staticmethod
+    def _npy_path(path: str) -> str:
+        # np.save appends .npy when it is missing; do the same on load
+        return path if path.endswith('.npy') else f"{path}.npy"
+
+    def save(self, path: str) -> None:
+        np.save(self._npy_path(path), self.hashes)
+
+    @classmethod
+    def load(cls, path: str) -> 'RowHashSet':
+        hash_set = cls()
+        hashes = np.load(cls._npy_path(path))
+        if len(hashes):
+            hash_set._push(hashes)
+        return hash_set
+
+
 class DataCleaner:
 
     @staticmethod
@@ -21,20 +111,65 @@ class DataCleaner:
                 raise
         return wrapper
 
+    @staticmethod
+    def _hash_keys(keys: pd.DataFrame) -> pd.DataFrame:
+        """
+        the key columns in one dtype per kind, so a value hashes the same in every chunk
+        (read_csv turns an int column into float64 in a chunk with a NaN): numbers as float64,
+        datetimes and timedeltas as int64 nanoseconds, everything else as strings
+        """
+        normalized = {}
+        for position in range(keys.shape[1]):
+            col = keys.iloc[:, position]
+            if pd.api.types.is_datetime64_any_dtype(col) or pd.api.types.is_timedelta64_dtype(col):
+                if isinstance(col.dtype, pd.DatetimeTZDtype):
+                    col = col.dt.tz_convert(None)
+                unit = 'datetime64[ns]' if col.dtype.kind == 'M' else 'timedelta64[ns]'
+                normalized[position] = col.to_numpy(dtype=unit).view(np.int64)
+            elif pd.api.types.is_numeric_dtype(col) and not isinstance(col.dtype, pd.CategoricalDtype):
+                # adding 0.0 also turns -0.0, which hashes differently, into 0.0
+                normalized[position] = col.to_numpy(dtype=np.float64, na_value=np.nan) + 0.0
+            else:
+                normalized[position] = col.astype('string').to_numpy()
+        return pd.DataFrame(normalized, index=keys.index)
+
     @log_decorator
-    def drop_duplicate(self, df: pd.DataFrame) -> pd.DataFrame:
+    def drop_duplicate(self, df: pd.DataFrame, subset: list = None, use_hash: bool = False,
+                       seen: RowHashSet = None) -> pd.DataFrame:
         """
-        drop duplicate rows
+        drop duplicate rows, comparing all columns or only the `subset` key columns
+        (e.g. ['bearer_id', 'start', 'msisdn/number']);
+        with use_hash=True rows are compared by one 64-bit hash each instead of full width,
+        and passing a RowHashSet as `seen` also drops rows seen in earlier chunks or runs
         """
-        df.drop_duplicates(inplace=True)
-        return df
+        if not use_hash and seen is None:
+            df.drop_duplicates(subset=subset, inplace=True)
+            return df
+
+        keys = df if subset is None else df[subset]
+        hashes = pd.util.hash_pandas_object(self._hash_keys(keys), index=False).to_numpy()
+        duplicated = pd.Series(hashes).duplicated().to_numpy()
+        if seen is not None:
+            duplicated = duplicated | seen.contains(hashes)
+            seen.add(hashes[~duplicated])
+        return df[~duplicated]
 
     @log_decorator
-    def convert_to_datetime(self, df: pd.DataFrame) -> pd.DataFrame:
+    def convert_to_datetime(self, df: pd.DataFrame, date_format: str = None, columns: list = None,
+                            derive_features: bool = False) -> pd.DataFrame:
         """
-        convert column to datetime
+        convert columns (start and end by default) to datetime;
+        a known `date_format` (e.g. '%m/%d/%Y %H:%M') skips format inference.
+        derive_features=True also adds start_hour, start_day and duration_(ms) recomputed from start/end
         """
-        df[['start', 'end']] = df[['start', 'end']].apply(pd.to_datetime)
+        columns = ['start', 'end'] if columns is None else list(columns)
+        for col in columns:
+            df[col] = pd.to_datetime(df[col], format=date_format)
+
+        if derive_features:
+            df['start_hour'] = df['start'].dt.hour
+            df['start_day'] = df['start'].dt.day
+            df['duration_(ms)'] = (df['end'] - df['start']).dt.total_seconds() * 1000
         return df
 
     @log_decorator
@@ -55,12 +190,16 @@ class DataCleaner:
         return df
 
     @log_decorator
-    def percent_missing(self, df: pd.DataFrame) -> float:
+    def percent_missing(self, df: pd.DataFrame, profile: pd.DataFrame = None) -> float:
         """
-        calculate the percentage of missing values from dataframe
+        calculate the percentage of missing values from dataframe,
+        reading the null counts from a ColumnProfiler profile when one is given
         """
-        total_cells = np.product(df.shape)
-        missing_count = df.isnull().sum()
+        total_cells = np.prod(df.shape)
+        if profile is None:
+            missing_count = df.isnull().sum()
+        else:
+            missing_count = profile['Missing Values']
         total_missing = missing_count.sum()
         return round(total_missing / total_cells * 100, 2)
 
@@ -79,16 +218,20 @@ class DataCleaner:
         return df.select_dtypes(include=['object', 'datetime64[ns]']).columns.to_list()
 
     @log_decorator
-    def percent_missing_column(self, df: pd.DataFrame, col: str) -> float:
+    def percent_missing_column(self, df: pd.DataFrame, col: str, profile: pd.DataFrame = None) -> float:
         """
-        calculate the percentage of missing values for the specified column
+        calculate the percentage of missing values for the specified column,
+        reading the null count from a ColumnProfiler profile when one is given
         """
         try:
             col_len = len(df[col])
         except KeyError:
             logger.error(f"{col} not found")
             raise
-        missing_count = df[col].isnull().sum()
+        if profile is None:
+            missing_count = df[col].isnull().sum()
+        else:
+            missing_count = profile.loc[col, 'Missing Values']
         return round(missing_count / col_len * 100, 2)
 
     @log_decorator
@@ -115,9 +258,11 @@ class DataCleaner:
             raise ValueError("Method unknown")
 
     @log_decorator
-    def fill_missing_values_numeric(self, df: pd.DataFrame, method: str, columns: list = None) -> pd.DataFrame:
+    def fill_missing_values_numeric(self, df: pd.DataFrame, method: str, columns: list = None,
+                                    approximate: bool = False) -> pd.DataFrame:
         """
-        fill missing values with specified method
+        fill missing values with specified method;
+        with approximate=True medians come from a t-digest sketch instead of a full sort
         """
         if columns is None:
             numeric_columns = self.get_numerical_columns(df)
@@ -125,26 +270,85 @@ class DataCleaner:
             numeric_columns = columns
 
         if method == "mean":
-            for col in numeric_columns:
-                df[col].fillna(df[col].mean(), inplace=True)
+            fill_values = df[numeric_columns].mean()
+        elif method == "median" and approximate:
+            fill_values = pd.Series({col: TDigest().update(df[col]).median() for col in numeric_columns}, dtype=float)
         elif method == "median":
-            for col in numeric_columns:
-                df[col].fillna(df[col].median(), inplace=True)
+            fill_values = df[numeric_columns].median()
         else:
             logger.error("Method unknown")
             raise ValueError("Method unknown")
 
+        # one fillna over all columns, assigned back so the caller's frame is filled too
+        df[numeric_columns] = df[numeric_columns].fillna(fill_values.to_dict())
         return df
 
     @log_decorator
-    def remove_nan_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+    def imputation_decisions(self, df: pd.DataFrame, skew_threshold: float = 0.5, profile: pd.DataFrame = None,
+                             cache_path: str = None) -> pd.DataFrame:
         """
-        remove columns with nan values for categorical columns
+        decide how to fill each column: numeric columns with |skew| below `skew_threshold`
+        by their mean, skewed ones by their median, categorical columns by their mode.
+        Skew comes from a ColumnProfiler profile when given, else from one skew() call.
+        With `cache_path` the table is pickled and reused by later runs on the same columns,
+        skipping the statistics pass; delete the file to recompute it
         """
+        if cache_path is not None and os.path.exists(cache_path):
+            cached = pd.read_pickle(cache_path)
+            if cached['columns'] == list(df.columns) and cached['skew_threshold'] == skew_threshold:
+                logger.info(f"Using cached imputation decisions from {cache_path}.")
+                return cached['decisions']
+
+        numeric_columns = self.get_numerical_columns(df)
         categorical_columns = self.get_categorical_columns(df)
-        for col in categorical_columns:
-            df = df[df[col] != 'nan']
-        return df
+        skew = df[numeric_columns].skew() if profile is None else profile['Skew'].reindex(numeric_columns)
+
+        decisions = pd.DataFrame({'Features': numeric_columns, 'Skew': skew.to_numpy()})
+        decisions['Absolute Skew'] = decisions['Skew'].abs()
+        decisions['Skewed'] = decisions['Absolute Skew'] >= skew_threshold
+        decisions['Method'] = np.where(decisions['Skewed'], 'median', 'mean')
+
+        mean_columns = decisions.loc[decisions['Method'] == 'mean', 'Features'].to_list()
+        median_columns = decisions.loc[decisions['Method'] == 'median', 'Features'].to_list()
+        fill_values = pd.concat([df[mean_columns].mean(), df[median_columns].median()])
+        decisions['Fill Value'] = decisions['Features'].map(fill_values).astype(object)
+
+        if categorical_columns:
+            modes = df[categorical_columns].mode()
+            modes = modes.iloc[0] if not modes.empty else pd.Series(np.nan, index=categorical_columns)
+            categorical = pd.DataFrame({'Features': categorical_columns, 'Method': 'mode',
+                                        'Fill Value': modes.reindex(categorical_columns).to_numpy()})
+            decisions = pd.concat([decisions, categorical], ignore_index=True)
+
+        if cache_path is not None:
+            pd.to_pickle({'columns': list(df.columns), 'skew_threshold': skew_threshold, 'decisions': decisions},
+                         cache_path)
+        return decisions
+
+    @log_decorator
+    def auto_impute(self, df: pd.DataFrame, skew_threshold: float = 0.5, profile: pd.DataFrame = None,
+                    cache_path: str = None) -> pd.DataFrame:
+        """
+        fill all missing values with a single fillna, using the mean/median/mode chosen per column
+        by imputation_decisions (cached in `cache_path` when given)
+        """
+        decisions = self.imputation_decisions(df, skew_threshold, profile, cache_path)
+        fill_values = decisions.dropna(subset=['Fill Value']).set_index('Features')['Fill Value']
+        return df.fillna(fill_values.to_dict())
+
+    @log_decorator
+    def remove_nan_categorical(self, df: pd.DataFrame, report: bool = False) -> pd.DataFrame:
+        """
+        remove rows with 'nan' values in any categorical column, filtering once with a combined mask;
+        with report=True log how many rows each column flags
+        """
+        categorical_columns = self.get_categorical_columns(df)
+        is_nan = df[categorical_columns] == 'nan'
+        if report:
+            drop_counts = is_nan.sum()
+            logger.info(f"remove_nan_categorical drops {int(is_nan.any(axis=1).sum())} rows; per column:\n"
+                        f"{drop_counts[drop_counts > 0].to_string()}")
+        return df[~is_nan.any(axis=1)]
 
     @log_decorator
     def normalizer(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -173,13 +377,17 @@ class DataCleaner:
                             columns=self.get_numerical_columns(df))
 
     @log_decorator
-    def handle_outliers(self, df: pd.DataFrame, col: str, method: str = 'IQR') -> pd.DataFrame:
+    def handle_outliers(self, df: pd.DataFrame, col: str, method: str = 'IQR', approximate: bool = False) -> pd.DataFrame:
         """
-        Handle Outliers of a specified column using Turkey's IQR method
+        Handle Outliers of a specified column using Turkey's IQR method;
+        with approximate=True the quartiles come from a t-digest sketch
         """
         df = df.copy()
-        q1 = df[col].quantile(0.25)
-        q3 = df[col].quantile(0.75)
+        if approximate:
+            q1, q3 = TDigest().update(df[col]).quantile([0.25, 0.75])
+        else:
+            q1 = df[col].quantile(0.25)
+            q3 = df[col].quantile(0.75)
 
         lower_bound = q1 - ((1.5) * (q3 - q1))
         upper_bound = q3 + ((1.5) * (q3 - q1))
@@ -194,3 +402,538 @@ class DataCleaner:
             df[col] = np.where(df[col] > upper_bound, upper_bound, df[col])
 
         return df
+
+    @staticmethod
+    def _integer_identifier(values: pd.Series):
+        """
+        `values` as int64/uint64, or nullable Int64/UInt64 when some are missing, if every
+        non-null value is a whole number (for text, only when the digits round-trip, so
+        '0208...' keeps its leading zero); None otherwise
+        """
+        present = values.notna()
+        numbers = pd.to_numeric(values, errors='coerce')
+        if not (numbers.notna() == present).all() or not (numbers[present] % 1 == 0).all():
+            return None
+        known = numbers[present]
+        if known.empty:
+            return None
+        nullable = not present.all()
+        if known.min() >= np.iinfo(np.int64).min and known.max() <= np.iinfo(np.int64).max:
+            identifier = numbers.astype('Int64' if nullable else np.int64)
+        elif known.min() >= 0 and known.max() < 2 ** 64:
+            identifier = numbers.astype('UInt64' if nullable else np.uint64)
+        else:
+            return None
+        if not pd.api.types.is_numeric_dtype(values) and \
+                not (identifier[present].astype(str) == values[present].astype(str).str.strip()).all():
+            return None
+        return identifier
+
+    @log_decorator
+    def optimize_dtypes(self, df: pd.DataFrame, identifier_columns: list = None, categorical_columns: list = None,
+                        lossy_floats: bool = False) -> pd.DataFrame:
+        """
+        downcast columns to compact dtypes and log the memory saved:
+        numeric counters to the smallest int/float type that holds their values exactly
+        (float32 for any float column with lossy_floats=True), whole-number identifiers to
+        int64/uint64 (nullable Int64/UInt64 when some are missing), text identifiers to pyarrow
+        strings, and handset columns to categoricals
+        """
+        if identifier_columns is None:
+            identifier_columns = [col for col in ['bearer_id', 'imsi', 'msisdn/number', 'imei'] if col in df.columns]
+        if categorical_columns is None:
+            categorical_columns = [col for col in ['handset_type', 'handset_manufacturer'] if col in df.columns]
+        memory_before = df.memory_usage(deep=True).sum()
+
+        converted = {}
+        for col in identifier_columns:
+            identifier = self._integer_identifier(df[col])
+            if identifier is not None:
+                converted[col] = identifier
+            elif not pd.api.types.is_numeric_dtype(df[col]):
+                converted[col] = df[col].astype('string[pyarrow]')
+
+        for col in categorical_columns:
+            converted[col] = df[col].astype('category')
+
+        skipped = set(identifier_columns) | set(categorical_columns)
+        for col in self.get_numerical_columns(df):
+            if col in skipped:
+                continue
+            values = df[col]
+            if pd.api.types.is_integer_dtype(values) or (values.notna().all() and (values % 1 == 0).all()):
+                downcast = 'unsigned' if len(values) and values.min() >= 0 else 'integer'
+                converted[col] = pd.to_numeric(values, downcast=downcast)
+            elif pd.api.types.is_float_dtype(values):
+                as_float32 = values.astype(np.float32)
+                if lossy_floats or np.array_equal(as_float32.to_numpy(dtype=np.float64), values.to_numpy(), equal_nan=True):
+                    converted[col] = as_float32
+
+        df = df.assign(**converted)
+        memory_after = df.memory_usage(deep=True).sum()
+        logger.info(f"optimize_dtypes reduced memory from {memory_before / 1024 ** 2:.2f} MB to "
+                    f"{memory_after / 1024 ** 2:.2f} MB ({memory_before / max(memory_after, 1):.1f}x).")
+        return df
+
+    @log_decorator
+    def cap_outliers(self, df: pd.DataFrame, columns: list, inplace: bool = False,
+                     bounds: pd.DataFrame = None) -> tuple:
+        """
+        Cap outliers of several columns at once using Tukey's IQR method.
+        All quartiles come from one quantile call and capping is a single clip.
+        Returns the DataFrame and the bounds used (rows 'lower'/'upper'); pass those
+        bounds back in to cap new data, e.g. at scoring time, exactly like the training data.
+        """
+        columns = list(columns)
+        if bounds is None:
+            bounds = _iqr_bounds(df[columns].quantile([0.25, 0.75]))
+        if not inplace:
+            df = df.copy()
+        df[columns] = df[columns].clip(bounds.loc['lower', columns], bounds.loc['upper', columns], axis=1)
+        return df, bounds
+
+
+class _FrameStatistics:
+    """
+    statistics of an in-memory DataFrame, computed with one vectorized reduction per call
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def means(self, columns: list) -> pd.Series:
+        return self.df[columns].mean()
+
+    def stds(self, columns: list) -> pd.Series:
+        # population std, as used by StandardScaler
+        return self.df[columns].std(ddof=0)
+
+    def mins(self, columns: list) -> pd.Series:
+        return self.df[columns].min()
+
+    def maxs(self, columns: list) -> pd.Series:
+        return self.df[columns].max()
+
+    def medians(self, columns: list) -> pd.Series:
+        return self.df[columns].median()
+
+    def quantiles(self, columns: list, q: list) -> pd.DataFrame:
+        return self.df[columns].quantile(q)
+
+    def modes(self, columns: list) -> pd.Series:
+        modes = self.df[columns].mode()
+        return modes.iloc[0] if not modes.empty else pd.Series(dtype=object)
+
+
+class _StreamingStatistics:
+    """
+    the same statistics as _FrameStatistics, accumulated chunk by chunk in bounded memory:
+    sums, sums of squares, counts, minima and maxima for means, stds and ranges,
+    t-digest sketches for medians and quantiles, and value counts for modes
+    """
+
+    def __init__(self, mean_columns: list, value_columns: list, mode_columns: list):
+        self.mean_columns = list(mean_columns)
+        self.value_columns = list(value_columns)
+        self.mode_columns = list(mode_columns)
+        self.sums = pd.Series(0.0, index=self.mean_columns)
+        self.squares = pd.Series(0.0, index=self.mean_columns)
+        self.counts = pd.Series(0, index=self.mean_columns)
+        self.minima = pd.Series(np.inf, index=self.mean_columns)
+        self.maxima = pd.Series(-np.inf, index=self.mean_columns)
+        self.sketches = {col: TDigest() for col in self.value_columns}
+        self.value_counts = {col: pd.Series(dtype=float) for col in self.mode_columns}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.mean_columns:
+            values = chunk[self.mean_columns]
+            self.sums += values.sum()
+            self.squares += (values ** 2).sum()
+            self.counts += values.count()
+            self.minima = np.minimum(self.minima, values.min())
+            self.maxima = np.maximum(self.maxima, values.max())
+        for col in self.value_columns:
+            self.sketches[col].update(chunk[col].to_numpy(dtype=float, na_value=np.nan))
+        for col in self.mode_columns:
+            self.value_counts[col] = self.value_counts[col].add(chunk[col].value_counts(), fill_value=0)
+
+    def means(self, columns: list) -> pd.Series:
+        return self.sums[columns] / self.counts[columns]
+
+    def stds(self, columns: list) -> pd.Series:
+        variance = self.squares[columns] / self.counts[columns] - self.means(columns) ** 2
+        return np.sqrt(variance.clip(lower=0))
+
+    def mins(self, columns: list) -> pd.Series:
+        return self.minima[columns]
+
+    def maxs(self, columns: list) -> pd.Series:
+        return self.maxima[columns]
+
+    def medians(self, columns: list) -> pd.Series:
+        return self.quantiles(columns, [0.5]).iloc[0]
+
+    def quantiles(self, columns: list, q: list) -> pd.DataFrame:
+        return pd.DataFrame({col: self.sketches[col].quantile(q) for col in columns}, index=q)
+
+    def modes(self, columns: list) -> pd.Series:
+        # ties resolve to the smallest value, as in pd.Series.mode
+        return pd.Series({col: self.value_counts[col].sort_index().idxmax()
+                          for col in columns if not self.value_counts[col].empty}, dtype=object)
+
+
+class CleaningPipeline:
+    """
+    Run a declarative list of DataCleaner steps, fusing the statistics-driven ones.
+
+    Steps are (method_name, kwargs) pairs naming DataCleaner methods, e.g.
+
+        CleaningPipeline([
+            ('drop_duplicate', {}),
+            ('remove_whitespace_column', {}),
+            ('convert_to_datetime', {}),
+            ('fill_missing_values_numeric', {'method': 'mean', 'columns': unskewed_features}),
+            ('fill_missing_values_numeric', {'method': 'median', 'columns': skewed_features}),
+            ('fill_missing_values_categorical', {'method': 'mode'}),
+            ('handle_outliers', {'col': 'dur._(ms)'}),
+        ]).run(df)
+
+    Consecutive fill steps form one stage: all means, medians and modes are computed with
+    one vectorized reduction each and applied with a single fillna(dict). Consecutive
+    handle_outliers steps form one stage as well: the quartiles of all their columns come
+    from one quantile call and capping is a single clip. min_max_scaler and standard_scaler
+    steps scale their `columns` (all numeric columns by default) in place within the frame.
+    Other steps run as in DataCleaner.
+
+    fit learns every statistic once (fill values, IQR bounds, scaler parameters), transform
+    applies them unchanged to new batches, e.g. a new day of xDRs scored with the clustering
+    models, and save/load persist them as JSON. run_chunked applies the same steps to data
+    that does not fit in memory.
+    """
+
+    FILL_STEPS = ('fill_missing_values_numeric', 'fill_missing_values_categorical')
+    OUTLIER_STEPS = ('handle_outliers',)
+    SCALE_STEPS = ('min_max_scaler', 'standard_scaler')
+    ROW_STEPS = ('drop_duplicate', 'remove_whitespace_column', 'convert_to_datetime', 'convert_to_string',
+                 'remove_nan_categorical')
+
+    def __init__(self, steps: list):
+        self.cleaner = DataCleaner()
+        self.steps = []
+        for name, kwargs in steps:
+            if name not in self.FILL_STEPS + self.OUTLIER_STEPS + self.SCALE_STEPS + self.ROW_STEPS:
+                logger.error(f"Step {name} unknown")
+                raise ValueError(f"Step {name} unknown")
+            self.steps.append((name, dict(kwargs)))
+        # one entry per stage once fitted; None for row stages
+        self.statistics_ = None
+
+    def _stages(self) -> list:
+        """
+        group consecutive fill steps and consecutive outlier steps into fused stages
+        """
+        stages = []
+        for name, kwargs in self.steps:
+            if name in self.FILL_STEPS:
+                kind = 'fill'
+            elif name in self.OUTLIER_STEPS:
+                kind = 'outliers'
+            elif name in self.SCALE_STEPS:
+                kind = 'scale'
+            else:
+                kind = 'row'
+            if kind in ('fill', 'outliers') and stages and stages[-1][0] == kind:
+                stages[-1][1].append((name, kwargs))
+            else:
+                stages.append((kind, [(name, kwargs)]))
+        return stages
+
+    def _plan(self, df: pd.DataFrame, kind: str, stage: list) -> dict:
+        """
+        resolve the method applied to each column of a statistics stage; for fills the first
+        step naming a column wins, as later sequential fills would find nothing left to fill
+        """
+        methods = {}
+        if kind == 'outliers':
+            for _, kwargs in stage:
+                methods[kwargs['col']] = kwargs.get('method', 'IQR')
+            return methods
+        if kind == 'scale':
+            name, kwargs = stage[0]
+            columns = kwargs.get('columns')
+            if columns is None:
+                columns = self.cleaner.get_numerical_columns(df)
+            return {col: name for col in columns}
+
+        for name, kwargs in stage:
+            method = kwargs.get('method')
+            if name == 'fill_missing_values_numeric':
+                columns = kwargs.get('columns')
+                if columns is None:
+                    columns = self.cleaner.get_numerical_columns(df)
+                valid_methods = ('mean', 'median')
+            else:
+                columns = df.select_dtypes(include=['object', 'datetime64[ns]']).columns
+                valid_methods = ('ffill', 'bfill', 'mode')
+            if method not in valid_methods:
+                logger.error("Method unknown")
+                raise ValueError("Method unknown")
+            for col in columns:
+                methods.setdefault(col, method)
+        return methods
+
+    @staticmethod
+    def _columns_by_method(plan: dict) -> dict:
+        columns_by_method = {}
+        for col, method in plan.items():
+            columns_by_method.setdefault(method, []).append(col)
+        return columns_by_method
+
+    def _streaming_statistics(self, kind: str, plan: dict) -> _StreamingStatistics:
+        """
+        accumulators for exactly the statistics a stage's plan needs
+        """
+        columns_by_method = self._columns_by_method(plan)
+        if kind == 'outliers':
+            return _StreamingStatistics([], list(plan), columns_by_method.get('mode', []))
+        if kind == 'scale':
+            return _StreamingStatistics(list(plan), [], [])
+        return _StreamingStatistics(columns_by_method.get('mean', []), columns_by_method.get('median', []),
+                                    columns_by_method.get('mode', []))
+
+    def _statistics(self, kind: str, plan: dict, stats) -> dict:
+        """
+        derive the values a stage applies from its plan and a statistics source
+        """
+        columns_by_method = self._columns_by_method(plan)
+        if kind == 'fill':
+            fill_values = {}
+            if 'mean' in columns_by_method:
+                fill_values.update(stats.means(columns_by_method['mean']).to_dict())
+            if 'median' in columns_by_method:
+                fill_values.update(stats.medians(columns_by_method['median']).to_dict())
+            if 'mode' in columns_by_method:
+                fill_values.update(stats.modes(columns_by_method['mode']).dropna().to_dict())
+            return {
+                'fill_values': fill_values,
+                'ffill': columns_by_method.get('ffill', []),
+                'bfill': columns_by_method.get('bfill', []),
+            }
+
+        if kind == 'scale':
+            # transform computes (x - shift) / scale, as MinMaxScaler / StandardScaler do
+            columns = list(plan)
+            if 'min_max_scaler' in columns_by_method:
+                shift = stats.mins(columns)
+                scale = stats.maxs(columns) - shift
+            else:
+                shift = stats.means(columns)
+                scale = stats.stds(columns)
+            scale = scale.where(scale != 0, 1.0)
+            return {'shift': shift.to_dict(), 'scale': scale.to_dict()}
+
+        # Tukey's IQR bounds of all columns from one quantile call
+        bounds = _iqr_bounds(stats.quantiles(list(plan), [0.25, 0.75]))
+        replacements = {}
+        if 'mode' in columns_by_method:
+            replacements.update(stats.modes(columns_by_method['mode']).to_dict())
+        if 'median' in columns_by_method:
+            replacements.update(stats.medians(columns_by_method['median']).to_dict())
+        return {'lower': bounds.loc['lower'].to_dict(), 'upper': bounds.loc['upper'].to_dict(),
+                'replacements': replacements}
+
+    def _apply_fill(self, df: pd.DataFrame, statistics: dict) -> pd.DataFrame:
+        """
+        fill all columns of a stage with a single fillna(dict) plus one ffill/bfill call
+        """
+        df = df.fillna(statistics['fill_values'])
+        if statistics['ffill']:
+            df[statistics['ffill']] = df[statistics['ffill']].ffill()
+        if statistics['bfill']:
+            df[statistics['bfill']] = df[statistics['bfill']].bfill()
+        return df
+
+    def _apply_outliers(self, df: pd.DataFrame, statistics: dict) -> pd.DataFrame:
+        """
+        cap outliers of all columns with one clip, or replace them with the mode/median
+        """
+        df = df.copy()
+        lower = pd.Series(statistics['lower'], dtype=float)
+        upper = pd.Series(statistics['upper'], dtype=float)
+        replaced = list(statistics['replacements'])
+        capped = [col for col in lower.index if col not in statistics['replacements']]
+
+        if capped:
+            bounds = pd.DataFrame({'lower': lower, 'upper': upper}).T
+            df, _ = self.cleaner.cap_outliers(df, capped, inplace=True, bounds=bounds)
+        if replaced:
+            outside = (df[replaced] < lower[replaced]) | (df[replaced] > upper[replaced])
+            df[replaced] = df[replaced].mask(outside, pd.Series(statistics['replacements']), axis=1)
+        return df
+
+    def _apply_scale(self, df: pd.DataFrame, statistics: dict) -> pd.DataFrame:
+        """
+        scale all columns of a stage with one vectorized subtraction and division
+        """
+        shift = pd.Series(statistics['shift'], dtype=float)
+        scale = pd.Series(statistics['scale'], dtype=float)
+        columns = list(shift.index)
+        df = df.copy()
+        df[columns] = (df[columns] - shift) / scale
+        return df
+
+    def _apply_stage(self, df: pd.DataFrame, kind: str, stage: list, statistics: dict) -> pd.DataFrame:
+        if kind == 'fill':
+            return self._apply_fill(df, statistics)
+        if kind == 'outliers':
+            return self._apply_outliers(df, statistics)
+        if kind == 'scale':
+            return self._apply_scale(df, statistics)
+        name, kwargs = stage[0]
+        return getattr(self.cleaner, name)(df, **kwargs)
+
+    @staticmethod
+    def _isolate_seen(stages: list) -> list:
+        """
+        give every RowHashSet passed as `seen` a snapshot (copy() shares the stored runs, it
+        does not duplicate them), so a pass that only learns statistics does not record rows
+        in the caller's set
+        """
+        return [(kind, [(name, {**kwargs, 'seen': kwargs['seen'].copy()}) if kwargs.get('seen') is not None
+                        else (name, kwargs) for name, kwargs in stage])
+                for kind, stage in stages]
+
+    def _fit_transform(self, df: pd.DataFrame, final: bool = True) -> pd.DataFrame:
+        statistics = []
+        stages = self._stages() if final else self._isolate_seen(self._stages())
+        if not final:
+            # row steps work in place; learning statistics must leave the caller's frame alone
+            df = df.copy()
+        for kind, stage in stages:
+            stage_statistics = None
+            if kind != 'row':
+                plan = self._plan(df, kind, stage)
+                stage_statistics = self._statistics(kind, plan, _FrameStatistics(df))
+            statistics.append(stage_statistics)
+            df = self._apply_stage(df, kind, stage, stage_statistics)
+        self.statistics_ = statistics
+        return df
+
+    @DataCleaner.log_decorator
+    def fit(self, df: pd.DataFrame) -> 'CleaningPipeline':
+        """
+        learn the statistics of every stage from the DataFrame
+        """
+        self._fit_transform(df, final=False)
+        return self
+
+    @DataCleaner.log_decorator
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        apply the fitted statistics to a new batch without recomputing them
+        """
+        if self.statistics_ is None:
+            logger.error("Pipeline is not fitted")
+            raise ValueError("Pipeline is not fitted")
+        for (kind, stage), statistics in zip(self._stages(), self.statistics_):
+            df = self._apply_stage(df, kind, stage, statistics)
+        return df
+
+    @DataCleaner.log_decorator
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        run all steps on the DataFrame, learning statistics from it (fit and transform)
+        """
+        return self._fit_transform(df)
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, pd.Timestamp):
+            return {'__timestamp__': value.isoformat()}
+        if isinstance(value, np.generic):
+            return value.item()
+        logger.error(f"Cannot serialize {type(value).__name__}")
+        raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+    @staticmethod
+    def _decode(value: dict):
+        if '__timestamp__' in value:
+            return pd.Timestamp(value['__timestamp__'])
+        return value
+
+    @DataCleaner.log_decorator
+    def save(self, path: str) -> None:
+        """
+        persist the steps and fitted statistics as JSON;
+        a RowHashSet passed as `seen` is not part of it (save it with RowHashSet.save)
+        """
+        if self.statistics_ is None:
+            logger.error("Pipeline is not fitted")
+            raise ValueError("Pipeline is not fitted")
+        steps = [(name, {key: value for key, value in kwargs.items() if key != 'seen'})
+                 for name, kwargs in self.steps]
+        state = {'steps': steps, 'statistics': self.statistics_}
+        with open(path, 'w') as f:
+            json.dump(state, f, default=self._encode)
+
+    @classmethod
+    def load(cls, path: str) -> 'CleaningPipeline':
+        """
+        restore a fitted pipeline saved with save
+        """
+        with open(path) as f:
+            state = json.load(f, object_hook=cls._decode)
+        pipeline = cls([(name, kwargs) for name, kwargs in state['steps']])
+        pipeline.statistics_ = state['statistics']
+        return pipeline
+
+    def _transform_chunks(self, chunks: Iterable[pd.DataFrame], stages: list, statistics: list,
+                          final: bool = False) -> Iterator[pd.DataFrame]:
+        if not final:
+            stages = self._isolate_seen(stages)
+        for chunk in chunks:
+            for (kind, stage), stage_statistics in zip(stages, statistics):
+                chunk = self._apply_stage(chunk, kind, stage, stage_statistics)
+            yield chunk
+
+    def run_chunked(self, chunk_source: Callable[[], Iterable[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+        """
+        Run all steps out of core over an iterator of DataFrame chunks.
+
+        `chunk_source` is called once per pass and must return a fresh iterator each time,
+        e.g. `lambda: Utils().load_data(path, chunksize=100000)` or
+        `lambda: get_dataframe_chunks('xdr_data')`. Each statistics stage (a run of fill
+        steps, a run of handle_outliers steps, or a scaler) gets one streaming pass computing
+        its global means, medians, modes, IQR bounds or scaler parameters over the output of the stages before it; a final
+        pass yields the cleaned chunks. The usual notebook pipeline (fills only) is two passes.
+        Medians and quartiles are t-digest estimates, so memory stays bounded.
+        ffill and bfill only see one chunk at a time, and so does drop_duplicate unless it
+        is given a RowHashSet as `seen`.
+        """
+        self.fit_chunked(chunk_source)
+        yield from self._transform_chunks(chunk_source(), self._stages(), self.statistics_, final=True)
+
+    @DataCleaner.log_decorator
+    def fit_chunked(self, chunk_source: Callable[[], Iterable[pd.DataFrame]]) -> 'CleaningPipeline':
+        """
+        learn the statistics of every stage out of core, one streaming pass per statistics stage
+        """
+        stages = self._stages()
+        statistics = [None] * len(stages)
+        for index, (kind, stage) in enumerate(stages):
+            if kind == 'row':
+                continue
+            plan, stats = None, None
+            for chunk in self._transform_chunks(chunk_source(), stages[:index], statistics[:index]):
+                if plan is None:
+                    plan = self._plan(chunk, kind, stage)
+                    stats = self._streaming_statistics(kind, plan)
+                stats.update(chunk)
+            if plan is None:
+                logger.error("No chunks to clean")
+                raise ValueError("No chunks to clean")
+            statistics[index] = self._statistics(kind, plan, stats)
+            logger.info(f"fit_chunked computed statistics of stage {index + 1}/{len(stages)}.")
+
+        self.statistics_ = statistics
+        return self
@@ -0,0 +1,122 @@
+import logging
+from typing import Iterable
+import pandas as pd
+import numpy as np
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ColumnProfiler:
+    """
+    Column statistics computed in a single pass over a DataFrame or a stream of chunks:
+    null counts and percentages, dtypes, min, max, mean, skew and cardinality of every column.
+
+    Moments are merged across chunks with Pébay's pairwise update, so skew matches
+    pd.Series.skew without a second pass. Cardinality is a k-minimum-values estimate: only
+    the `cardinality_sample` smallest distinct 64-bit hashes of each column are kept, so memory
+    stays bounded; it is exact below that many distinct values and within about
+    1/sqrt(cardinality_sample) relative error above.
+    """
+
+    def __init__(self, cardinality_sample: int = 16384):
+        self.cardinality_sample = cardinality_sample
+        self.rows = 0
+        self.nulls = pd.Series(dtype=float)
+        self.dtypes = pd.Series(dtype=object)
+        self.n = pd.Series(dtype=float)
+        self.mean = pd.Series(dtype=float)
+        self.m2 = pd.Series(dtype=float)
+        self.m3 = pd.Series(dtype=float)
+        self.minima = pd.Series(dtype=object)
+        self.maxima = pd.Series(dtype=object)
+        self.distinct = {}
+
+    def update(self, chunk: pd.DataFrame) -> 'ColumnProfiler':
+        """
+        fold one chunk into the profile
+        """
+        self.rows += len(chunk)
+        self.nulls = self.nulls.add(chunk.isna().sum(), fill_value=0)
+        if self.dtypes.empty:
+            self.dtypes = chunk.dtypes
+
+        ordered = chunk.select_dtypes(include=['number', 'datetime'])
+        minima, maxima = ordered.min(), ordered.max()
+        self.minima = minima if self.minima.empty else pd.concat([self.minima, minima], axis=1).min(axis=1)
+        self.maxima = maxima if self.maxima.empty else pd.concat([self.maxima, maxima], axis=1).max(axis=1)
+
+        numeric = chunk.select_dtypes(include=['number']).astype(float)
+        n_b = numeric.count()
+        mean_b = numeric.mean()
+        deviations = numeric - mean_b
+        m2_b = (deviations ** 2).sum()
+        m3_b = (deviations ** 3).sum()
+        if self.n.empty:
+            self.n, self.mean, self.m2, self.m3 = n_b, mean_b.fillna(0), m2_b, m3_b
+        else:
+            n_a, mean_a, m2_a, m3_a = self.n, self.mean, self.m2, self.m3
+            n = n_a + n_b
+            delta = (mean_b.fillna(0) - mean_a).where(n_b > 0, 0)
+            safe_n = n.where(n > 0, 1)
+            self.mean = mean_a + delta * n_b / safe_n
+            self.m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / safe_n
+            self.m3 = (m3_a + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / safe_n ** 2
+                       + 3 * delta * (n_a * m2_b - n_b * m2_a) / safe_n)
+            self.n = n
+
+        k = self.cardinality_sample
+        for col in chunk.columns:
+            hashes = np.unique(pd.util.hash_pandas_object(chunk[col].dropna(), index=False).to_numpy())[:k]
+            self.distinct[col] = np.union1d(self.distinct[col], hashes)[:k] if col in self.distinct else hashes
+        return self
+
+    def update_chunks(self, chunks: Iterable[pd.DataFrame]) -> 'ColumnProfiler':
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def cardinality(self, col) -> int:
+        """
+        distinct non-null values of `col`: exact while fewer than cardinality_sample were seen,
+        else the KMV estimate (k - 1) / (k-th smallest hash as a fraction of the hash space)
+        """
+        kept = self.distinct.get(col, np.empty(0, dtype=np.uint64))
+        if len(kept) < self.cardinality_sample:
+            return len(kept)
+        return int(round((self.cardinality_sample - 1) / (float(kept[-1]) / 2.0 ** 64)))
+
+    def skew(self) -> pd.Series:
+        """
+        adjusted Fisher-Pearson skewness, as pd.Series.skew
+        """
+        n = self.n
+        m2 = self.m2 / n
+        m3 = self.m3 / n
+        skew = np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5
+        skew = skew.where(m2 > 0, 0.0)
+        return skew.where(n > 2)
+
+    def profile(self) -> pd.DataFrame:
+        """
+        one row per column with every statistic of the profile
+        """
+        columns = self.dtypes.index
+        profile = pd.DataFrame(index=columns)
+        profile['Missing Values'] = self.nulls.reindex(columns).astype(int)
+        profile['% of Total Values'] = 100 * profile['Missing Values'] / self.rows if self.rows else 0.0
+        profile['Dtype'] = self.dtypes
+        profile['Min'] = self.minima.reindex(columns)
+        profile['Max'] = self.maxima.reindex(columns)
+        profile['Mean'] = self.mean.where(self.n > 0).reindex(columns)
+        profile['Skew'] = self.skew().reindex(columns)
+        profile['Cardinality'] = pd.Series({col: self.cardinality(col) for col in columns})
+        return profile
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        profile an in-memory DataFrame
+        """
+        return cls().update(df).profile()
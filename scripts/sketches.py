@@ -0,0 +1,105 @@
+import logging
+import numpy as np
+
+# Setting up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TDigest:
+    """
+    Mergeable t-digest quantile sketch (Dunning & Ertl).
+
+    Values are summarized by weighted centroids that are small near the tails and larger
+    around the median, so quantiles such as the IQR quartiles stay accurate with a few
+    hundred centroids regardless of how many values were seen. Sketches can be updated
+    chunk by chunk, merged across workers and shipped with to_dict/from_dict.
+    """
+
+    def __init__(self, compression: float = 1000):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values) -> 'TDigest':
+        """
+        add values to the sketch, ignoring missing ones
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._compress(values, np.ones(values.size))
+        return self
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """
+        fold another sketch, e.g. one built by another worker, into this one
+        """
+        if other.count:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(other.means, other.weights)
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """
+        merge new centroids into the sketch with one sort and one grouped sum
+        """
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        # k1 scale function: a cluster may span at most one unit of k
+        q_left = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        clusters = np.floor(k - k[0]).astype(np.int64)
+
+        cluster_weights = np.bincount(clusters, weights=weights)
+        cluster_sums = np.bincount(clusters, weights=weights * means)
+        keep = cluster_weights > 0
+        self.weights = cluster_weights[keep]
+        self.means = cluster_sums[keep] / self.weights
+        self.count = total
+
+    def quantile(self, q):
+        """
+        estimate quantiles with the same linear interpolation as pd.Series.quantile,
+        exact while every centroid still holds a single value
+        """
+        q = np.asarray(q, dtype=float)
+        if not self.count:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        # centroid centers on the 0 .. count-1 rank scale used by pandas
+        positions = np.cumsum(self.weights) - self.weights / 2 - 0.5
+        positions = np.concatenate([[0.0], positions, [self.count - 1]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * (self.count - 1), positions, values)
+
+    def median(self) -> float:
+        return float(self.quantile(0.5))
+
+    def to_dict(self) -> dict:
+        return {
+            'compression': self.compression,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist(),
+            'min': float(self.min),
+            'max': float(self.max),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'TDigest':
+        digest = cls(state['compression'])
+        digest.means = np.asarray(state['means'], dtype=float)
+        digest.weights = np.asarray(state['weights'], dtype=float)
+        digest.count = float(digest.weights.sum())
+        digest.min = state['min']
+        digest.max = state['max']
+        return digest
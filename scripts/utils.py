@@ -1,9 +1,10 @@
 import logging
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Iterator, List, Tuple, Union
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from scripts.aggregation import leaderboards, top_k
 
 # Setting up logging
 logging.basicConfig(level=logging.INFO)
@@ -24,12 +25,14 @@ class Utils:
         return wrapper
 
     @log_decorator
-    def load_data(self, data_path: str, dtype: Optional[Dict[str, Union[str, int, float]]] = None) -> pd.DataFrame:
+    def load_data(self, data_path: str, dtype: Optional[Dict[str, Union[str, int, float]]] = None,
+                  chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
         """
         Load data from a csv file.
+        With `chunksize`, return an iterator of DataFrames of that many rows instead.
         """
         try:
-            df = pd.read_csv(data_path, dtype=dtype)
+            df = pd.read_csv(data_path, dtype=dtype, chunksize=chunksize)
         except FileNotFoundError:
             logger.error("File not found.")
             raise
@@ -49,22 +52,15 @@ class Utils:
     
         # Function to calculate missing values by column
     @log_decorator
-    def missing_values_table(self, df: pd.DataFrame) -> pd.DataFrame:
-        # Total missing values
-        mis_val = df.isnull().sum()
+    def missing_values_table(self, df: pd.DataFrame, profile: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        # Null counts, percentages and dtypes from a ColumnProfiler profile, or one isnull() pass
+        if profile is None:
+            mis_val = df.isnull().sum()
+            profile = pd.DataFrame({'Missing Values': mis_val, '% of Total Values': 100 * mis_val / len(df),
+                                    'Dtype': df.dtypes})
 
-        # Percentage of missing values
-        mis_val_percent = 100 * df.isnull().sum() / len(df)
-
-        # dtype of missing values
-        mis_val_dtype = df.dtypes
-
-        # Make a table with the results
-        mis_val_table = pd.concat([mis_val, mis_val_percent, mis_val_dtype], axis=1)
-
-        # Rename the columns
-        mis_val_table_ren_columns = mis_val_table.rename(
-        columns = {0 : 'Missing Values', 1 : '% of Total Values', 2: 'Dtype'})
+        # Keep the missing value columns
+        mis_val_table_ren_columns = profile[['Missing Values', '% of Total Values', 'Dtype']]
 
         # Sort the table by percentage of missing descending
         mis_val_table_ren_columns = mis_val_table_ren_columns[
@@ -83,12 +79,37 @@ class Utils:
     def format_float(value: float) -> str:
         return f'{value:,.2f}'
 
-    def find_agg(self,df:pd.DataFrame, agg_column:str, agg_metric:str, col_name:str, top:int, order=False )->pd.DataFrame:
-        
-        new_df = df.groupby(agg_column)[agg_column].agg(agg_metric).reset_index(name=col_name).\
-                            sort_values(by=col_name, ascending=order)[:top]
-        
-        return new_df
+    def find_agg(self, df: pd.DataFrame, agg_column: str, agg_metric: str = 'count', col_name: str = 'count',
+                 top: int = 10, order=False,
+                 metrics: Optional[Union[List[Tuple[str, str]], Dict[str, Tuple[str, str]]]] = None,
+                 keep: str = 'first') -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """
+            Top (order=False) or bottom (order=True) `top` groups of `agg_column`.
+
+            Without `metrics`, aggregates `agg_column` itself with `agg_metric` into `col_name`
+            and returns that single leaderboard, as before.
+
+            With `metrics`, a list of (column, aggregation) pairs (named "<column>_<aggregation>")
+            or a dict of name -> (column, aggregation), all metrics come from one groupby and a
+            dict of name -> leaderboard is returned. keep='all' also returns the groups tied
+            with the last one, so a leaderboard can be longer than `top`.
+        """
+        if metrics is None:
+            metrics = {col_name: (agg_column, agg_metric)}
+            single = True
+        else:
+            if not isinstance(metrics, dict):
+                metrics = {f"{column}_{aggregation}": (column, aggregation) for column, aggregation in metrics}
+            single = False
+
+        aggregated = df.groupby(agg_column).agg(**metrics).reset_index()
+        if keep == 'first':
+            boards = leaderboards(aggregated, list(metrics), top, largest=not order)
+        else:
+            boards = {name: top_k(aggregated, name, top, largest=not order, keep=keep) for name in metrics}
+        boards = {name: board[[agg_column, name]] for name, board in boards.items()}
+
+        return boards[col_name] if single else boards
 
     def convert_bytes_to_megabytes(self,df, bytes_data):
 